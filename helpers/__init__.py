@@ -1,35 +1,77 @@
 import re
+from typing import Tuple
 
 from dateutil.relativedelta import relativedelta
 
 from .dates import get_row_by_date
 from .graphing import (df_to_close_series, import_and_filter_csv,
                        pretty_line_chart)
+from .profiling import profile_run
 
 
-def parse_timeframe(timeframe: str) -> relativedelta:
+TRADING_DAY_UNIT = "t"
+CALENDAR_UNITS = ("d", "w", "m", "q", "y")
+
+
+def split_timeframe(timeframe: str) -> Tuple[int, str]:
     """
-    Parses a timeframe argument into a relativedelta object.
+    Splits a timeframe argument into its amount and unit.
 
-    :param timeframe: Timeframe string in the format <number><unit>, e.g. "1d", "2m", "3y".
-    :raises ValueError: If the timeframe format is invalid.
-    :return:
+    :param timeframe: Timeframe string in the format <number><unit>, e.g. "1d", "2w", "3m", "1q", "1y", or "21t"
+        for 21 trading days.
+    :raises ValueError: If the timeframe format or unit is invalid.
+    :return: The amount and the unit.
     """
-    timeframe_match = re.search(r"(\d+)(\w+)", timeframe)
+    timeframe_match = re.fullmatch(r"(\d+)([a-z]+)", timeframe.strip().lower())
 
-    if timeframe_match is None or len(timeframe_match.groups()) != 2:
-        raise ValueError("Invalid timeframe format")
+    if timeframe_match is None:
+        raise ValueError(f"Invalid timeframe format: {timeframe!r}")
 
     timeframe_amt = int(timeframe_match.group(1))
     timeframe_unit = timeframe_match.group(2)
 
-    delta = relativedelta(days=0)
+    if timeframe_unit not in CALENDAR_UNITS and timeframe_unit != TRADING_DAY_UNIT:
+        raise ValueError(f"Invalid timeframe unit: {timeframe!r}")
+
+    return timeframe_amt, timeframe_unit
+
+
+def parse_timeframe(timeframe: str) -> relativedelta:
+    """
+    Parses a calendar timeframe argument into a relativedelta object.
+
+    :param timeframe: Timeframe string in the format <number><unit>, e.g. "1d", "2w", "3m", "1q", "1y".
+    :raises ValueError: If the timeframe format is invalid, or if it counts trading days, which have no
+        calendar equivalent.
+    :return: The calendar offset of the timeframe.
+    """
+    timeframe_amt, timeframe_unit = split_timeframe(timeframe)
 
     if timeframe_unit == "d":
-        delta = relativedelta(days=timeframe_amt)
-    elif timeframe_unit == "m":
-        delta = relativedelta(months=timeframe_amt)
-    elif timeframe_unit == "y":
-        delta = relativedelta(years=timeframe_amt)
+        return relativedelta(days=timeframe_amt)
+    if timeframe_unit == "w":
+        return relativedelta(weeks=timeframe_amt)
+    if timeframe_unit == "m":
+        return relativedelta(months=timeframe_amt)
+    if timeframe_unit == "q":
+        return relativedelta(months=3 * timeframe_amt)
+    if timeframe_unit == "y":
+        return relativedelta(years=timeframe_amt)
+
+    raise ValueError(f"Trading-day timeframe has no calendar offset: {timeframe!r}")
+
+
+def calendar_span(timeframe: str) -> relativedelta:
+    """
+    Returns a calendar offset at least as long as the timeframe, for padding date ranges.
+
+    :param timeframe: Any timeframe accepted by split_timeframe.
+    :return: The exact offset for calendar timeframes, a generous estimate for trading-day timeframes.
+    """
+    timeframe_amt, timeframe_unit = split_timeframe(timeframe)
+
+    if timeframe_unit == TRADING_DAY_UNIT:
+        # ~252 trading days a year, plus slack for holidays.
+        return relativedelta(days=timeframe_amt * 3 // 2 + 7)
 
-    return delta
+    return parse_timeframe(timeframe)
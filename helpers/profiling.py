@@ -0,0 +1,175 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The project functions a slow backtest usually spends its time in.
+HOT_PATHS = (
+    "load_stock",
+    "from_tickers",
+    "window",
+    "calculate_best_worst",
+    "eligible",
+    "lookback_returns",
+    "calculate_positions",
+    "calculate_position_daily",
+    "digest",
+    "get_row_by_date",
+    "concat",
+)
+
+
+class StackSampler:
+    """Samples the call stacks of one or every thread at a fixed interval, for flamegraphs."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        """
+        Constructor for the StackSampler class.
+
+        :param thread_id: The `threading.get_ident()` of the thread to sample. Defaults to every thread
+            but the sampler's own, each stack rooted at its thread's name.
+        :param interval: Seconds between samples.
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        """Records the sampled threads' stacks, root first, until stopped."""
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames.get(self.thread_id)}
+            else:
+                frames.pop(threading.get_ident(), None)
+                thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for thread_id, frame in frames.items():
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                if not names:
+                    continue
+                if self.thread_id is None:
+                    names.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(names))] += 1
+
+    def start(self):
+        """Starts sampling in a background thread."""
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and waits for the background thread to finish."""
+        self._stop.set()
+        self._thread.join()
+
+    def write_collapsed(self, path: str):
+        """
+        Writes the samples in the collapsed-stack format read by flamegraph.pl and speedscope.
+
+        :param path: The file to write.
+        :return: None
+        """
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def hot_path_summary(stats: pstats.Stats) -> Dict[str, Tuple[int, float, float]]:
+    """
+    Aggregates profiler stats for the functions in HOT_PATHS.
+
+    :param stats: The stats of a profiled run.
+    :return: Function name to (calls, own seconds, cumulative seconds), summed over every
+        function of that name.
+    """
+    summary: Dict[str, Tuple[int, float, float]] = {}
+
+    for (_, _, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        if name not in HOT_PATHS:
+            continue
+        total_calls, total_own, total_cumulative = summary.get(name, (0, 0.0, 0.0))
+        summary[name] = (total_calls + calls, total_own + own, total_cumulative + cumulative)
+
+    return summary
+
+
+def profile_run(
+    func: Callable[..., Any],
+    *args,
+    output: str = "profile",
+    top_n: int = 20,
+    interval: float = 0.005,
+    **kwargs,
+) -> Any:
+    """
+    Runs a function under cProfile and a stack sampler, then exports and summarizes the profile.
+
+    Threads started by the function, such as loader workers, are profiled and sampled too,
+    and their stats are merged into the calling thread's.
+
+    Writes `<output>.pstats` (open with `python -m pstats` or snakeviz) and
+    `<output>.collapsed` (feed to flamegraph.pl or speedscope), and prints the time spent
+    in the project's hot paths followed by the top-N functions by cumulative time.
+
+    :param func: The function to profile, e.g. `portfolio.run_custom_sectors`.
+    :param args: Positional arguments for func.
+    :param output: The path prefix of the exported files.
+    :param top_n: How many functions to list in the summary.
+    :param interval: Seconds between stack samples.
+    :param kwargs: Keyword arguments for func.
+    :return: Whatever func returns.
+    """
+    profiler = cProfile.Profile()
+    sampler = StackSampler(interval=interval)
+    thread_profilers: List[cProfile.Profile] = []
+
+    def profile_thread(frame, event, arg):
+        # Runs once in each thread started during the run, e.g. loader workers, and
+        # hands that thread over to its own profiler.
+        thread_profiler = cProfile.Profile()
+        try:
+            thread_profiler.enable()
+        except ValueError:
+            # The profiler already covers every thread (sys.monitoring, Python 3.12+).
+            sys.setprofile(None)
+            return
+        thread_profilers.append(thread_profiler)
+
+    sampler.start()
+    threading.setprofile(profile_thread)
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+    finally:
+        threading.setprofile(None)
+        sampler.stop()
+
+    sampler.write_collapsed(f"{output}.collapsed")
+
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    for thread_profiler in thread_profilers:
+        stats.add(thread_profiler)
+    stats.dump_stats(f"{output}.pstats")
+
+    print("Hot Paths:")
+    print(f"{'Function':<28}{'Calls':>10}{'Own (s)':>12}{'Cumulative (s)':>16}")
+    summary = hot_path_summary(stats)
+    for name, (calls, own, cumulative) in sorted(
+        summary.items(), key=lambda item: item[1][2], reverse=True
+    ):
+        print(f"{name:<28}{calls:>10}{own:>12.3f}{cumulative:>16.3f}")
+
+    stats.sort_stats("cumulative").print_stats(top_n)
+    print(stream.getvalue())
+    print(f"Profile written to {output}.pstats and {output}.collapsed")
+
+    return result
@@ -1,3 +1,4 @@
+import argparse
 import sys
 from datetime import datetime
 
@@ -5,11 +6,27 @@ import matplotlib.pyplot as plt
 import pandas as pd
 
 from helpers import (df_to_close_series, import_and_filter_csv,
-                     pretty_line_chart)
+                     pretty_line_chart, profile_run)
 from sector import Sector, sp500_sectors
 from testbench import Portfolio
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the mean reversal backtest.")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        metavar="PREFIX",
+        help="Profile the backtest and write PREFIX.pstats and PREFIX.collapsed (default: profile).",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="How many functions to list in the profile summary.",
+    )
+    args = parser.parse_args()
+
     sectors = sp500_sectors()
 
     START_DATE = "2022-10-12"
@@ -42,7 +59,15 @@ if __name__ == "__main__":
     custom_clusters.index = pd.to_datetime(custom_clusters.index)
 
     # portfolio.run_strategy(sector_list)
-    portfolio.run_custom_sectors(custom_clusters)
+    if args.profile:
+        profile_run(
+            portfolio.run_custom_sectors,
+            custom_clusters,
+            output=args.profile,
+            top_n=args.top,
+        )
+    else:
+        portfolio.run_custom_sectors(custom_clusters)
     sys.exit(0)
 
     # # Graphing
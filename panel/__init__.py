@@ -0,0 +1,6 @@
+from .compact import CompactPricePanel
+from .panel import PricePanel
+from .prefetch import Prefetcher
+from .schedule import Period, build_schedule
+from .signals import SignalEngine
+from .store import PartitionedStore
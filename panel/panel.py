@@ -0,0 +1,475 @@
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .prefetch import Prefetcher
+from .schedule import Period
+
+
+def _frame_columns(
+    df: pd.DataFrame,
+    start_date,
+    end_date,
+    dtype,
+    date_keys: Callable[[pd.DatetimeIndex], np.ndarray],
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Reduces a ticker's DataFrame to (date keys, opens, closes) arrays, or None if it has no prices."""
+    if "Open" not in df.columns or "Close" not in df.columns:
+        return None
+
+    df = df.sort_index()
+    df = df[~df.index.duplicated(keep="last")]
+    df = df.loc[start_date:end_date]
+
+    dates = date_keys(pd.DatetimeIndex(df.index))
+
+    # Freshly downloaded data is still made of strings.
+    opens = pd.to_numeric(df["Open"], errors="coerce").to_numpy(dtype=dtype)
+    closes = pd.to_numeric(df["Close"], errors="coerce").to_numpy(dtype=dtype)
+
+    return dates, opens, closes
+
+
+def _trading_dates(
+    all_dates: np.ndarray, columns: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]
+) -> np.ndarray:
+    """
+    Keeps the dates on which at least half of the tickers listed at the time have a bar.
+
+    A stray bar, e.g. one ticker's Saturday print, would otherwise add a row that
+    every other ticker is missing and make them all ineligible for that test.
+    A ticker counts as listed from its first bar to its last.
+    """
+    counts = np.zeros(len(all_dates), dtype=np.int64)
+    listed = np.zeros(len(all_dates) + 1, dtype=np.int64)
+
+    for dates, _, _ in columns.values():
+        if not len(dates):
+            continue
+        rows = np.searchsorted(all_dates, dates)
+        counts[rows] += 1
+        listed[rows[0]] += 1
+        listed[rows[-1] + 1] -= 1
+
+    return all_dates[2 * counts >= np.cumsum(listed[:-1])]
+
+
+class PricePanel:
+    """Open and close prices for many tickers aligned on a single trading calendar.
+
+    Prices are stored as (dates x tickers) arrays together with a precomputed
+    availability mask, so deciding whether a ticker can take part in a test
+    costs a couple of array lookups instead of a DataFrame load and slice.
+    Only the Open and Close columns are kept; High, Low and Volume are dropped
+    as each ticker is loaded. The calendar holds the dates most tickers trade,
+    so one ticker's stray bar does not leave a gap in every other ticker.
+    """
+
+    price_dtype = np.float64
+
+    tickers: List[str]
+    opens: np.ndarray
+    closes: np.ndarray
+    available: np.ndarray
+    load_errors: Dict[str, str]
+
+    def __init__(
+        self,
+        dates: pd.DatetimeIndex,
+        tickers: List[str],
+        opens: np.ndarray,
+        closes: np.ndarray,
+        load_errors: Optional[Dict[str, str]] = None,
+    ):
+        """
+        Constructor for the PricePanel class.
+
+        Args:
+            dates (pd.DatetimeIndex): The sorted trading dates, one per row.
+            tickers (list[str]): The tickers, one per column.
+            opens (np.ndarray): The (dates x tickers) array of opening prices, NaN where missing.
+            closes (np.ndarray): The (dates x tickers) array of closing prices, NaN where missing.
+            load_errors (dict[str, str]): Tickers that could not be loaded, mapped to the reason.
+        """
+        self._set_calendar(pd.DatetimeIndex(dates))
+        self.tickers = list(tickers)
+        self.opens = opens.astype(self.price_dtype, copy=False)
+        self.closes = closes.astype(self.price_dtype, copy=False)
+        self.load_errors = dict(load_errors or {})
+
+        # A bar is usable only if both prices exist and the open can be divided by.
+        with np.errstate(invalid="ignore"):
+            self.available = (self.opens > 0) & (self.closes > 0)
+
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    def _set_calendar(self, dates: pd.DatetimeIndex):
+        self._dates = dates
+
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        """The trading dates, one per row."""
+        return self._dates
+
+    @property
+    def nbytes(self) -> int:
+        """The memory taken by the price arrays, the availability mask and the calendar."""
+        return (
+            self.opens.nbytes
+            + self.closes.nbytes
+            + self.available.nbytes
+            + self._dates.asi8.nbytes
+        )
+
+    @staticmethod
+    def _date_keys(dates: pd.DatetimeIndex) -> np.ndarray:
+        """Encodes dates as the sortable integers a panel's calendar is assembled from, int64 nanoseconds."""
+        return dates.values.astype("datetime64[ns]").view(np.int64)
+
+    @staticmethod
+    def _keys_to_dates(keys: np.ndarray) -> pd.DatetimeIndex:
+        """Decodes the integers made by `_date_keys` back into dates."""
+        return pd.DatetimeIndex(keys.view("datetime64[ns]"))
+
+    @classmethod
+    def _assemble(
+        cls,
+        columns: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]],
+        load_errors: Dict[str, str],
+    ) -> "PricePanel":
+        """
+        Aligns per-ticker (date keys, opens, closes) arrays on the dates most of them trade, see `_trading_dates`.
+
+        Each ticker's arrays are removed from `columns` as soon as they are placed, so
+        they are freed while the panel fills instead of after it is complete.
+        """
+        if not columns:
+            empty = np.empty((0, 0), dtype=cls.price_dtype)
+            return cls(pd.DatetimeIndex([]), [], empty, empty.copy(), load_errors)
+
+        # A running union, rather than one over every ticker's dates concatenated,
+        # keeps the calendar the only extra array alive while it is built.
+        all_dates = next(iter(columns.values()))[0]
+        for dates, _, _ in columns.values():
+            rows = np.searchsorted(all_dates, dates)
+            if not (rows < len(all_dates)).all() or (all_dates[rows] != dates).any():
+                all_dates = np.union1d(all_dates, dates)
+
+        all_dates = _trading_dates(all_dates, columns)
+
+        tickers = list(columns)
+        opens = np.full((len(all_dates), len(tickers)), np.nan, dtype=cls.price_dtype)
+        closes = np.full((len(all_dates), len(tickers)), np.nan, dtype=cls.price_dtype)
+
+        for col, ticker in enumerate(tickers):
+            dates, ticker_opens, ticker_closes = columns.pop(ticker)
+            rows = np.searchsorted(all_dates, dates)
+            # Bars on dates dropped from the calendar are dropped with them.
+            placed = rows < len(all_dates)
+            placed[placed] = all_dates[rows[placed]] == dates[placed]
+            opens[rows[placed], col] = ticker_opens[placed]
+            closes[rows[placed], col] = ticker_closes[placed]
+
+        return cls(cls._keys_to_dates(all_dates), tickers, opens, closes, load_errors)
+
+    @classmethod
+    def from_frames(
+        cls,
+        frames: Dict[str, pd.DataFrame],
+        start_date: Optional[object] = None,
+        end_date: Optional[object] = None,
+        load_errors: Optional[Dict[str, str]] = None,
+    ) -> "PricePanel":
+        """
+        Builds a panel from per-ticker DataFrames indexed by date.
+
+        Args:
+            frames (dict[str, pd.DataFrame]): Ticker to DataFrame with at least "Open" and "Close" columns.
+            start_date: The first date to keep. Defaults to the earliest available date.
+            end_date: The last date to keep. Defaults to the latest available date.
+            load_errors (dict[str, str]): Tickers that already failed to load, mapped to the reason.
+
+        Returns:
+            PricePanel: The aligned panel.
+        """
+        errors = dict(load_errors or {})
+        columns = {}
+
+        for ticker, df in frames.items():
+            ticker_columns = _frame_columns(
+                df, start_date, end_date, cls.price_dtype, cls._date_keys
+            )
+            if ticker_columns is None:
+                errors[ticker] = "missing Open/Close columns"
+            else:
+                columns[ticker] = ticker_columns
+
+        return cls._assemble(columns, errors)
+
+    @classmethod
+    def from_tickers(
+        cls,
+        tickers: Iterable[str],
+        loader: Callable[[str], pd.DataFrame],
+        start_date: Optional[object] = None,
+        end_date: Optional[object] = None,
+        workers: int = 1,
+        source: Optional[Callable[[str], str]] = None,
+    ) -> "PricePanel":
+        """
+        Loads every ticker once and builds a panel from them.
+
+        Each DataFrame is reduced to its open and close arrays as soon as it is
+        loaded, so the full frames are never held in memory together. Tickers
+        whose loader raises are recorded in `load_errors` instead of aborting
+        the whole load.
+
+        Args:
+            tickers (Iterable[str]): The tickers to load. Duplicates are loaded once.
+            loader (Callable[[str], pd.DataFrame]): Returns a ticker's DataFrame, e.g. `Sector.load_stock`.
+            start_date: The first date to keep. Defaults to the earliest available date.
+            end_date: The last date to keep. Defaults to the latest available date.
+            workers (int): How many tickers to load concurrently, to overlap downloads and file reads.
+            source (Callable[[str], str]): Maps a ticker to the one its data is loaded under, e.g.
+                `Sector.source_ticker`. Tickers sharing a source are loaded once, so no two workers
+                ever fetch or write the same data. Defaults to every ticker being its own source.
+
+        Returns:
+            PricePanel: The aligned panel.
+        """
+
+        def load(ticker: str):
+            try:
+                df = loader(ticker)
+            except Exception as exc:
+                return f"load failed: {exc}"
+
+            ticker_columns = _frame_columns(
+                df, start_date, end_date, cls.price_dtype, cls._date_keys
+            )
+            if ticker_columns is None:
+                return "missing Open/Close columns"
+            return ticker_columns
+
+        tickers = list(dict.fromkeys(tickers))
+        sources = {ticker: source(ticker) if source else ticker for ticker in tickers}
+        unique_sources = list(dict.fromkeys(sources.values()))
+
+        if workers == 1:
+            # Inline, so the loads show up when the calling thread is profiled.
+            results = ((name, load(name)) for name in unique_sources)
+        else:
+            results = Prefetcher(load, unique_sources, depth=2 * workers, workers=workers)
+        loaded = dict(results)
+
+        columns = {}
+        errors: Dict[str, str] = {}
+
+        for ticker in tickers:
+            ticker_loaded = loaded[sources[ticker]]
+            if isinstance(ticker_loaded, str):
+                errors[ticker] = ticker_loaded
+            else:
+                columns[ticker] = ticker_loaded
+
+        # `columns` now holds the only references, so _assemble can free each ticker once placed.
+        del loaded
+        return cls._assemble(columns, errors)
+
+    def row(self, date, side: str = "left") -> int:
+        """
+        Finds the row offset of a date in the trading calendar.
+
+        Args:
+            date: The date to look up.
+            side (str): "left" returns the first row on or after the date, "right" the first row after it.
+
+        Returns:
+            int: The row offset, between 0 and len(dates).
+        """
+        return int(self.dates.searchsorted(pd.Timestamp(date), side=side))
+
+    def column(self, ticker: str) -> Optional[int]:
+        """Returns the column of a ticker, or None if it is not in the panel."""
+        return self._columns.get(ticker)
+
+    @property
+    def code_dtype(self) -> type:
+        """The smallest integer type that can hold a column code."""
+        return np.int16 if len(self.tickers) < np.iinfo(np.int16).max else np.int32
+
+    def codes(self, tickers: List[str]) -> np.ndarray:
+        """
+        Encodes tickers as their integer column codes.
+
+        Args:
+            tickers (list[str]): The tickers to encode.
+
+        Returns:
+            np.ndarray: One code per ticker, -1 for tickers not in the panel.
+        """
+        return np.array(
+            [self._columns.get(ticker, -1) for ticker in tickers], dtype=self.code_dtype
+        )
+
+    def sector_codes(self, sectors: Dict[str, List[str]]) -> np.ndarray:
+        """
+        Encodes the sector of every column as an integer, in the order of `sectors`.
+
+        Args:
+            sectors (dict[str, list[str]]): Sector name to its tickers.
+
+        Returns:
+            np.ndarray: One int16 code per column, -1 for tickers without a sector.
+        """
+        sector_codes = np.full(len(self.tickers), -1, dtype=np.int16)
+
+        for code, stocks in enumerate(sectors.values()):
+            cols = self.codes(stocks)
+            sector_codes[cols[cols >= 0]] = code
+
+        return sector_codes
+
+    def eligible(
+        self, tickers: List[str], period: Period
+    ) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Splits tickers into those with enough data for a test period and those without.
+
+        A ticker is eligible when it has a bar on the first and last rows of the
+        lookback window and on every row of the test window.
+
+        Args:
+            tickers (list[str]): The tickers to check.
+            period (Period): The rows of the lookback and test windows.
+
+        Returns:
+            tuple[list[str], dict[str, str]]: The eligible tickers, in input order, and the excluded tickers mapped to the reason.
+        """
+        excluded: Dict[str, str] = {}
+        known: List[str] = []
+
+        for ticker in tickers:
+            if ticker in self._columns:
+                known.append(ticker)
+            else:
+                excluded[ticker] = self.load_errors.get(ticker, "no price data")
+
+        if not known:
+            return [], excluded
+
+        if period.lookback_start < 0 or period.lookback_end <= period.lookback_start:
+            excluded.update({ticker: "empty lookback window" for ticker in known})
+            return [], excluded
+
+        if period.test_end <= period.rebalance or period.test_end > len(self.dates):
+            excluded.update({ticker: "empty test window" for ticker in known})
+            return [], excluded
+
+        cols = self.codes(known)
+        lookback_ok = (
+            self.available[period.lookback_start, cols]
+            & self.available[period.lookback_end - 1, cols]
+        )
+        test_ok = self.available[period.rebalance : period.test_end, cols].all(axis=0)
+
+        eligible: List[str] = []
+        for ticker, has_lookback, has_test in zip(known, lookback_ok, test_ok):
+            if not has_lookback:
+                excluded[ticker] = "insufficient lookback data"
+            elif not has_test:
+                excluded[ticker] = "insufficient test data"
+            else:
+                eligible.append(ticker)
+
+        return eligible, excluded
+
+    def lookback_returns(self, tickers: List[str], period: Period) -> np.ndarray:
+        """
+        Calculates the open-to-close percentage return of tickers over the period's lookback window.
+
+        Args:
+            tickers (list[str]): The tickers, which must all be eligible for the period.
+            period (Period): The rows of the lookback window.
+
+        Returns:
+            np.ndarray: The returns in percent, in the same order as `tickers`.
+        """
+        cols = self.codes(tickers)
+        initial_price = self.opens[period.lookback_start, cols].astype(np.float64)
+        final_price = self.closes[period.lookback_end - 1, cols].astype(np.float64)
+
+        return (final_price - initial_price) / initial_price * 100
+
+    def period(self, start_date, midpoint_date, end_date) -> Period:
+        """
+        Converts lookback start, rebalance and inclusive test end dates into a Period.
+
+        Args:
+            start_date: The first date of the lookback window.
+            midpoint_date: The date positions are opened; the lookback window ends the trading day before.
+            end_date: The last date of the test window.
+
+        Returns:
+            Period: The matching rows of this panel.
+        """
+        rebalance = self.row(midpoint_date)
+
+        return Period(
+            self.row(start_date), rebalance, rebalance, self.row(end_date, side="right")
+        )
+
+    def digest(self, tickers: List[str], start: int, end: int) -> str:
+        """
+        Fingerprints the tickers' prices over rows [start, end), so results derived from them can be cached.
+
+        The digest changes whenever any of those prices, the dates of those rows, or a
+        ticker's load error changes, and is unaffected by data outside the rows.
+
+        Args:
+            tickers (list[str]): The tickers, in order.
+            start (int): The first row.
+            end (int): One past the last row.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        """
+        h = hashlib.sha256()
+        h.update(self.dates[start:end].asi8.tobytes())
+
+        for ticker in tickers:
+            h.update(ticker.encode() + b"\0")
+            col = self._columns.get(ticker)
+            if col is None:
+                h.update(self.load_errors.get(ticker, "no price data").encode() + b"\0")
+                continue
+            h.update(np.ascontiguousarray(self.opens[start:end, col]).tobytes())
+            h.update(np.ascontiguousarray(self.closes[start:end, col]).tobytes())
+
+        return h.hexdigest()
+
+    def frame(
+        self, ticker: str, start: int = 0, end: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Returns a ticker's rows [start, end) as a date-indexed DataFrame with "Open" and "Close" columns.
+
+        Args:
+            ticker (str): The ticker.
+            start (int): The first row.
+            end (int): One past the last row. Defaults to the end of the panel.
+
+        Returns:
+            pd.DataFrame: The ticker's prices, including rows where it has no data.
+        """
+        col = self._columns[ticker]
+
+        return pd.DataFrame(
+            {
+                "Open": self.opens[start:end, col].astype(np.float64),
+                "Close": self.closes[start:end, col].astype(np.float64),
+            },
+            index=self.dates[start:end],
+        )
@@ -0,0 +1,65 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Generic, Iterable, Iterator, Tuple, TypeVar
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class Prefetcher(Generic[Item, Result]):
+    """Runs `func` over items in background threads, at most `depth` items ahead of the consumer.
+
+    Results are handed back in item order, so loading the next items overlaps
+    with whatever the consumer does with the current one, while no more than
+    `depth` finished or in-flight results are held at a time. With one worker
+    the items are processed strictly in order on a single thread, which keeps
+    stateful loaders (such as a PartitionedStore) single-threaded.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[Item], Result],
+        items: Iterable[Item],
+        depth: int = 2,
+        workers: int = 1,
+    ):
+        """
+        Constructor for the Prefetcher class.
+
+        Args:
+            func (Callable): Loads one item, e.g. reads a ticker or a test window.
+            items (Iterable): The items, in the order they will be consumed.
+            depth (int): How many items may be loaded ahead of the consumer.
+            workers (int): How many threads load items concurrently.
+        """
+        if depth < 1 or workers < 1:
+            raise ValueError("Prefetch depth and workers must be at least 1")
+
+        self.func = func
+        self.items = iter(items)
+        self.depth = depth
+        self.workers = workers
+
+    def __iter__(self) -> Iterator[Tuple[Item, Result]]:
+        """
+        Yields (item, result) pairs in item order.
+
+        An exception raised by `func` is re-raised here, for the item it failed on.
+        """
+        pending: Deque[Tuple[Item, Future]] = deque()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for item in self.items:
+                    pending.append((item, executor.submit(self.func, item)))
+                    if len(pending) > self.depth:
+                        ready, future = pending.popleft()
+                        yield ready, future.result()
+
+                while pending:
+                    ready, future = pending.popleft()
+                    yield ready, future.result()
+            finally:
+                # Stopped early: don't start loading anything that is still queued.
+                for _, future in pending:
+                    future.cancel()
@@ -0,0 +1,148 @@
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from helpers import TRADING_DAY_UNIT, parse_timeframe, split_timeframe
+
+
+class Period(NamedTuple):
+    """One walk-forward test, as row offsets into a trading calendar.
+
+    The lookback window is rows [lookback_start, lookback_end) and the test
+    window is rows [rebalance, test_end). `rebalance` is after `lookback_end`
+    only when a skip gap is scheduled.
+    """
+
+    lookback_start: int
+    lookback_end: int
+    rebalance: int
+    test_end: int
+
+    def shifted(self, offset: int) -> "Period":
+        """Returns the same period with every row moved by `offset`, e.g. into a window that starts at row `-offset`."""
+        return Period(*(row + offset for row in self))
+
+
+def _advance(
+    dates: pd.DatetimeIndex, row: int, date: datetime, timeframe: str, sign: int
+) -> Tuple[int, Optional[datetime]]:
+    """
+    Moves a calendar position forward (sign=1) or backward (sign=-1) by a timeframe.
+
+    Trading-day timeframes move by whole rows; calendar timeframes move the date and
+    land on the first trading day on or after it.
+
+    Returns:
+        tuple[int, datetime | None]: The new row and date. The date is None when a
+        trading-day move leaves the calendar. The row is negative when a move backward
+        lands before the first trading day.
+    """
+    amount, unit = split_timeframe(timeframe)
+
+    if unit == TRADING_DAY_UNIT:
+        row = row + sign * amount
+        if 0 <= row < len(dates):
+            return row, dates[row].to_pydatetime()
+        return row, None
+
+    date = date + sign * parse_timeframe(timeframe)
+    if sign < 0 and pd.Timestamp(date) < dates[0]:
+        # searchsorted would clamp this to row 0, shortening the window.
+        return -1, date
+    return int(dates.searchsorted(pd.Timestamp(date), side="left")), date
+
+
+def build_schedule(
+    dates: pd.DatetimeIndex,
+    start_date: datetime,
+    end_date: datetime,
+    lookback: str,
+    test: str,
+    step: Optional[str] = None,
+    skip: Optional[str] = None,
+) -> List[Period]:
+    """
+    Precomputes every walk-forward period between two dates as row offsets into `dates`.
+
+    The k-th lookback window ends at `start_date` advanced k steps. Calendar steps are
+    taken from `start_date` itself rather than from the previous period, so months of
+    different lengths never make the schedule drift.
+
+    Args:
+        dates (pd.DatetimeIndex): The sorted trading calendar, e.g. `PricePanel.dates`.
+        start_date (datetime): The end of the first lookback window.
+        end_date (datetime): No test window extends past this date.
+        lookback (str): The lookback interval, e.g. "3m" or "63t" for 63 trading days.
+        test (str): How long each position is held, e.g. "1m".
+        step (str): The spacing between periods. Defaults to `test`; shorter steps give
+            overlapping windows and longer steps leave gaps between tests.
+        skip (str): A gap between the end of the lookback window and opening the
+            positions, e.g. "1w". Defaults to no gap.
+
+    Raises:
+        ValueError: If any interval is invalid.
+
+    Returns:
+        list[Period]: The periods, in order. Periods whose lookback starts before the
+        calendar, whose test window is empty, or that would open on the same trading
+        day as the previous period (a step shorter than the gap between trading days)
+        are left out.
+    """
+    step = step or test
+    if skip is not None:
+        split_timeframe(skip)
+
+    for name, timeframe in (("Lookback", lookback), ("Test", test), ("Step", step)):
+        if split_timeframe(timeframe)[0] == 0:
+            raise ValueError(f"{name} must be positive: {timeframe!r}")
+
+    step_amount, step_unit = split_timeframe(step)
+
+    end_limit = int(dates.searchsorted(pd.Timestamp(end_date), side="right"))
+    anchor = int(dates.searchsorted(pd.Timestamp(start_date), side="left"))
+
+    schedule: List[Period] = []
+    k = 0
+
+    while True:
+        if step_unit == TRADING_DAY_UNIT:
+            lookback_end = anchor + k * step_amount
+            if lookback_end >= len(dates):
+                break
+            formation_date = dates[lookback_end].to_pydatetime()
+        else:
+            formation_date = start_date + parse_timeframe(step) * k
+            lookback_end = int(
+                dates.searchsorted(pd.Timestamp(formation_date), side="left")
+            )
+        k += 1
+
+        lookback_start, _ = _advance(dates, lookback_end, formation_date, lookback, -1)
+
+        rebalance, rebalance_date = lookback_end, formation_date
+        if skip is not None:
+            rebalance, rebalance_date = _advance(dates, rebalance, rebalance_date, skip, 1)
+
+        if rebalance_date is None:
+            break
+
+        test_end, test_end_date = _advance(dates, rebalance, rebalance_date, test, 1)
+
+        if split_timeframe(test)[1] == TRADING_DAY_UNIT:
+            if test_end > end_limit:
+                break
+        elif test_end_date > end_date:
+            break
+
+        if lookback_start < 0 or lookback_start >= lookback_end or rebalance >= test_end:
+            continue
+
+        # A step shorter than the gap between trading days (e.g. "1d" over a weekend)
+        # maps several formation dates to one row; the test would be held for no rows.
+        if schedule and rebalance == schedule[-1].rebalance:
+            continue
+
+        schedule.append(Period(lookback_start, lookback_end, rebalance, test_end))
+
+    return schedule
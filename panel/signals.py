@@ -0,0 +1,157 @@
+import warnings
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from .panel import PricePanel
+from .schedule import Period
+
+SignalFunc = Callable[["SignalEngine", np.ndarray, np.ndarray], np.ndarray]
+
+
+def _nan_reduce(func: Callable[..., np.ndarray], values: np.ndarray, **kwargs) -> np.ndarray:
+    """Reduces down the rows of a window, skipping missing bars, NaN for tickers without enough of them."""
+    with warnings.catch_warnings():
+        # All-NaN columns (tickers not listed yet) are expected and come back NaN.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        return func(values, axis=0, **kwargs)
+
+
+class SignalEngine:
+    """Computes ranking signals for every ticker of a panel at once, as array operations.
+
+    A signal reduces a lookback window, the (window x tickers) opens and
+    closes of rows [lookback_start, lookback_end), to one value per ticker,
+    where higher values mean the ticker ran up more, so the strategy SHORTs
+    the highest value in a sector and LONGs the lowest. Only the windows the
+    schedule ranks on are ever computed, and the latest period's scores are
+    kept, so every sector of a test shares one computation. New signals can
+    be added with `register`.
+    """
+
+    SIGNALS: Dict[str, SignalFunc] = {}
+
+    panel: PricePanel
+
+    def __init__(self, panel: PricePanel):
+        """
+        Constructor for the SignalEngine class.
+
+        Args:
+            panel (PricePanel): The prices to compute signals on.
+        """
+        self.panel = panel
+        self._latest: Dict[Tuple[str, Period], np.ndarray] = {}
+
+    @classmethod
+    def register(cls, name: str) -> Callable[[SignalFunc], SignalFunc]:
+        """
+        Decorator that adds a signal, computed by `func(engine, opens, closes)` from a
+        window's (window x tickers) float64 prices as one value per ticker.
+
+        Args:
+            name (str): The name the signal is selected by, e.g. in `Portfolio(signal=...)`.
+        """
+
+        def wrap(func: SignalFunc) -> SignalFunc:
+            cls.SIGNALS[name] = func
+            return func
+
+        return wrap
+
+    def scores(self, name: str, period: Period) -> np.ndarray:
+        """
+        Returns a signal over a period's lookback window, for every ticker.
+
+        Args:
+            name (str): The signal, one of `SIGNALS`.
+            period (Period): The period whose lookback window, rows [lookback_start, lookback_end), is scored.
+
+        Raises:
+            ValueError: If the signal is unknown.
+
+        Returns:
+            np.ndarray: One value per panel column, NaN where a ticker lacks data for the window.
+        """
+        if name not in self.SIGNALS:
+            raise ValueError(f"Unknown signal: {name!r}")
+
+        key = (name, period)
+        if key not in self._latest:
+            rows = slice(period.lookback_start, period.lookback_end)
+            opens = self.panel.opens[rows].astype(np.float64)
+            closes = self.panel.closes[rows].astype(np.float64)
+
+            # Only the period being ranked is kept; the schedule never goes back.
+            self._latest = {key: self.SIGNALS[name](self, opens, closes)}
+
+        return self._latest[key]
+
+
+@SignalEngine.register("return")
+def lookback_return(engine: SignalEngine, opens: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """Open-to-close percentage return over the window, as ranked by `Sector.calculate_best_worst`."""
+    initial_price = opens[0]
+    final_price = closes[-1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        performance = (final_price - initial_price) / initial_price * 100
+        performance[~((initial_price > 0) & (final_price > 0))] = np.nan
+
+    return performance
+
+
+def _daily_returns(closes: np.ndarray) -> np.ndarray:
+    """Close-to-close daily returns inside the window, NaN around missing bars, which the reductions skip."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return closes[1:] / closes[:-1] - 1
+
+
+@SignalEngine.register("vol_return")
+def volatility_normalized_return(
+    engine: SignalEngine, opens: np.ndarray, closes: np.ndarray
+) -> np.ndarray:
+    """Lookback return divided by the daily volatility scaled to the window, i.e. a return in standard deviations."""
+    if len(closes) < 3:
+        raise ValueError("vol_return needs a window of at least 3 rows")
+
+    daily_returns = _daily_returns(closes)
+    volatility = _nan_reduce(np.nanstd, daily_returns, ddof=1) * np.sqrt(len(daily_returns))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return lookback_return(engine, opens, closes) / 100 / volatility
+
+
+@SignalEngine.register("rsi")
+def relative_strength_index(
+    engine: SignalEngine, opens: np.ndarray, closes: np.ndarray
+) -> np.ndarray:
+    """Relative strength index (0-100) of the close-to-close moves inside the window, using simple averages."""
+    if len(closes) < 2:
+        raise ValueError("rsi needs a window of at least 2 rows")
+
+    moves = closes[1:] - closes[:-1]
+
+    # Clipping keeps NaN moves NaN, so moves around a missing bar are skipped.
+    average_gain = _nan_reduce(np.nanmean, np.clip(moves, 0, None))
+    average_loss = _nan_reduce(np.nanmean, np.clip(-moves, 0, None))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsi = 100 - 100 / (1 + average_gain / average_loss)
+
+    # No moves at all is neutral rather than undefined.
+    rsi[(average_gain == 0) & (average_loss == 0)] = 50
+    return rsi
+
+
+@SignalEngine.register("bollinger")
+def bollinger_distance(engine: SignalEngine, opens: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """Distance of the last close from the window's mean close, in standard deviations of the closes."""
+    if len(closes) < 2:
+        raise ValueError("bollinger needs a window of at least 2 rows")
+
+    mean = _nan_reduce(np.nanmean, closes)
+    std = _nan_reduce(np.nanstd, closes, ddof=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (closes[-1] - mean) / std
@@ -0,0 +1,272 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .compact import CompactPricePanel
+from .panel import PricePanel
+
+
+class PartitionedStore:
+    """On-disk price store partitioned by calendar year and ticker block.
+
+    Each partition is one .npz file holding a block of tickers' opens and
+    closes for one year, next to a manifest and the shared trading calendar.
+    `window` reads only the partitions a span of rows touches and keeps them
+    until `release_before` drops the years the walk-forward has left behind,
+    so memory stays proportional to the largest window rather than to the
+    whole history.
+    """
+
+    directory: str
+    blocks: List[List[str]]
+    tickers: List[str]
+    load_errors: Dict[str, str]
+    compact: bool
+    calendar: pd.DatetimeIndex
+
+    def __init__(self, directory: str):
+        """
+        Opens a store written by `build`.
+
+        Args:
+            directory (str): The store's directory.
+        """
+        self.directory = directory
+
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        self.blocks = manifest["blocks"]
+        self.tickers = [ticker for block in self.blocks for ticker in block]
+        self.load_errors = manifest["load_errors"]
+        self.compact = manifest["compact"]
+
+        self._calendar_ns = np.load(os.path.join(directory, "calendar.npy"))
+        self.calendar = pd.DatetimeIndex(self._calendar_ns.view("datetime64[ns]"))
+        self._years = self.calendar.year.to_numpy()
+
+        self._block_of = {
+            ticker: block for block, stocks in enumerate(self.blocks) for ticker in stocks
+        }
+        self._partitions: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        directory: str,
+        tickers: Iterable[str],
+        loader: Callable[[str], pd.DataFrame],
+        block_size: int = 500,
+        compact: bool = False,
+        workers: int = 1,
+        source: Optional[Callable[[str], str]] = None,
+    ) -> "PartitionedStore":
+        """
+        Loads tickers one block at a time and writes them out as yearly partitions.
+
+        The store is written to a staging directory next to `directory` and only
+        replaces it once complete, so a rebuild never mixes in partitions of the old store.
+
+        Args:
+            directory (str): Where to write the store. An existing store there is replaced.
+            tickers (Iterable[str]): The universe. Duplicates are stored once.
+            loader (Callable[[str], pd.DataFrame]): Returns a ticker's DataFrame, e.g. `Sector.load_stock`.
+            block_size (int): How many tickers are loaded into memory at once and stored per partition.
+            compact (bool): Store float32 prices and read windows back as CompactPricePanel.
+            workers (int): How many tickers to load concurrently.
+            source (Callable[[str], str]): Maps a ticker to the one its data is loaded under, e.g.
+                `Sector.source_ticker`, see `PricePanel.from_tickers`.
+
+        Raises:
+            ValueError: If `directory` holds files but is not a store.
+
+        Returns:
+            PartitionedStore: The opened store.
+        """
+        if (
+            os.path.isdir(directory)
+            and os.listdir(directory)
+            and not os.path.exists(os.path.join(directory, "manifest.json"))
+        ):
+            raise ValueError(f"Not a PartitionedStore, refusing to replace: {directory!r}")
+
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".store-", dir=parent)
+
+        try:
+            cls._write(staging, tickers, loader, block_size, compact, workers, source)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+
+        return cls(directory)
+
+    @staticmethod
+    def _write(
+        directory: str,
+        tickers: Iterable[str],
+        loader: Callable[[str], pd.DataFrame],
+        block_size: int,
+        compact: bool,
+        workers: int,
+        source: Optional[Callable[[str], str]],
+    ):
+        """Writes the partitions, calendar and manifest of a new store into an empty directory."""
+        panel_class = CompactPricePanel if compact else PricePanel
+        tickers = list(dict.fromkeys(tickers))
+
+        blocks: List[List[str]] = []
+        load_errors: Dict[str, str] = {}
+        calendar = np.empty(0, dtype=np.int64)
+
+        for start in range(0, len(tickers), block_size):
+            panel = panel_class.from_tickers(
+                tickers[start : start + block_size], loader, workers=workers, source=source
+            )
+            load_errors.update(panel.load_errors)
+
+            if not panel.tickers:
+                continue
+
+            block = len(blocks)
+            blocks.append(panel.tickers)
+
+            dates = panel.dates
+            dates_ns = dates.values.astype("datetime64[ns]").view(np.int64)
+            calendar = np.union1d(calendar, dates_ns)
+
+            years = dates.year.to_numpy()
+            for year in np.unique(years):
+                rows = years == year
+                year_directory = os.path.join(directory, str(year))
+                os.makedirs(year_directory, exist_ok=True)
+                np.savez(
+                    os.path.join(year_directory, f"block{block:05d}.npz"),
+                    dates=dates_ns[rows],
+                    opens=panel.opens[rows],
+                    closes=panel.closes[rows],
+                )
+
+            # Only this block's arrays are ever in memory.
+            del panel
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "calendar.npy"), calendar)
+
+        with open(os.path.join(directory, "manifest.json"), "w") as f:
+            json.dump(
+                {"blocks": blocks, "load_errors": load_errors, "compact": compact}, f
+            )
+
+    def _year_rows(self, year: int) -> Tuple[int, int]:
+        """Returns the calendar rows [start, end) of a year."""
+        return (
+            int(np.searchsorted(self._years, year, side="left")),
+            int(np.searchsorted(self._years, year, side="right")),
+        )
+
+    def _partition(self, year: int, block: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Reads one partition, aligned to the year's calendar rows, or returns it if it is already loaded."""
+        if (year, block) in self._partitions:
+            return self._partitions[(year, block)]
+
+        dtype = np.float32 if self.compact else np.float64
+        start, end = self._year_rows(year)
+        shape = (end - start, len(self.blocks[block]))
+        opens = np.full(shape, np.nan, dtype=dtype)
+        closes = np.full(shape, np.nan, dtype=dtype)
+
+        path = os.path.join(self.directory, str(year), f"block{block:05d}.npz")
+        if os.path.exists(path):
+            with np.load(path) as partition:
+                rows = np.searchsorted(self._calendar_ns[start:end], partition["dates"])
+                opens[rows] = partition["opens"]
+                closes[rows] = partition["closes"]
+
+        self._partitions[(year, block)] = (opens, closes)
+        return opens, closes
+
+    @property
+    def loaded_partitions(self) -> int:
+        """The number of partitions currently held in memory."""
+        return len(self._partitions)
+
+    def window(
+        self, start: int, end: int, tickers: Optional[Iterable[str]] = None
+    ) -> PricePanel:
+        """
+        Builds a panel of calendar rows [start, end), reading only the partitions it needs.
+
+        Args:
+            start (int): The first calendar row.
+            end (int): One past the last calendar row.
+            tickers (Iterable[str]): Only read the blocks holding these tickers. Defaults to every block.
+
+        Returns:
+            PricePanel: The window, whose row 0 is calendar row `start`. A
+            CompactPricePanel if the store is compact.
+        """
+        if tickers is None:
+            blocks = list(range(len(self.blocks)))
+        else:
+            blocks = sorted(
+                {self._block_of[ticker] for ticker in tickers if ticker in self._block_of}
+            )
+
+        panel_class = CompactPricePanel if self.compact else PricePanel
+        columns = [ticker for block in blocks for ticker in self.blocks[block]]
+
+        opens_parts = []
+        closes_parts = []
+
+        if start < end and blocks:
+            for year in range(int(self._years[start]), int(self._years[end - 1]) + 1):
+                year_start, year_end = self._year_rows(year)
+                lo = max(start, year_start) - year_start
+                hi = min(end, year_end) - year_start
+                partitions = [self._partition(year, block) for block in blocks]
+                opens_parts.append(np.hstack([opens[lo:hi] for opens, _ in partitions]))
+                closes_parts.append(np.hstack([closes[lo:hi] for _, closes in partitions]))
+
+        if not opens_parts:
+            empty = np.full((max(end - start, 0), len(columns)), np.nan)
+            return panel_class(
+                self.calendar[start:end],
+                columns,
+                empty,
+                empty.copy(),
+                self.load_errors,
+            )
+
+        return panel_class(
+            self.calendar[start:end],
+            columns,
+            np.vstack(opens_parts),
+            np.vstack(closes_parts),
+            self.load_errors,
+        )
+
+    def release_before(self, row: int):
+        """
+        Drops every loaded partition from years before the one containing a calendar row.
+
+        Args:
+            row (int): The earliest calendar row that is still needed.
+        """
+        if row >= len(self._years):
+            self._partitions.clear()
+            return
+
+        first_year = self._years[max(row, 0)]
+        for key in [key for key in self._partitions if key[0] < first_year]:
+            del self._partitions[key]
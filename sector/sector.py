@@ -1,13 +1,15 @@
 import os
 from datetime import datetime
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 
 from financialcalc.positions import PositionType, calculate_position
 from macrotrends import MacroTrends
+from panel import Period, PricePanel
 
 
 class Sector:
@@ -16,18 +18,20 @@ class Sector:
     start_date: datetime
     midpoint_date: datetime
     end_date: datetime
+    period: Optional[Period] = None
 
     best_stock: str = ""
-    best_stock_df: pd.DataFrame
     best_stock_performance: float
 
     worst_stock: str = ""
-    worst_stock_df: pd.DataFrame
     worst_stock_performance: float
 
     short_performance: float
     long_performance: float
 
+    ranking: List[Tuple[str, float]]
+    excluded: Dict[str, str]
+
     def __init__(self, sector_name: str, sector_stocks: List[str]):
         """
         Constructor for the Session class.
@@ -53,6 +57,36 @@ class Sector:
         self.start_date = datetime.strptime(start_date, "%Y-%m-%d")
         self.midpoint_date = datetime.strptime(midpoint_date, "%Y-%m-%d")
         self.end_date = datetime.strptime(end_date, "%Y-%m-%d")
+        self.period = None
+
+    def set_period(self, panel: PricePanel, period: Period):
+        """
+        Sets the lookback and test windows from a scheduled period, along with the matching dates.
+
+        Args:
+            panel (PricePanel): The panel whose rows the period refers to.
+            period (Period): The rows of the lookback and test windows.
+        """
+        self.period = period
+        self.start_date = panel.dates[period.lookback_start].to_pydatetime()
+        self.midpoint_date = panel.dates[period.rebalance].to_pydatetime()
+        self.end_date = panel.dates[period.test_end - 1].to_pydatetime()
+
+    @staticmethod
+    def source_ticker(stock_ticker: str) -> str:
+        """
+        Returns the ticker whose data file a ticker is loaded from.
+
+        Args:
+            stock_ticker (str): The ticker as it appears in a sector, e.g. "X.1".
+
+        Returns:
+            str: The ticker without the suffix pandas adds to duplicate columns, e.g. "X".
+        """
+        # Change In Production!!
+        if stock_ticker.endswith(".1"):
+            return stock_ticker[:-2]
+        return stock_ticker
 
     @staticmethod
     def load_stock(stock_ticker: str) -> pd.DataFrame:
@@ -65,9 +99,7 @@ class Sector:
         Returns:
             pd.DataFrame: The DataFrame representing the stock's historical price.
         """
-        # Change In Production!!
-        if stock_ticker.endswith(".1"):
-            stock_ticker = stock_ticker[:-2]
+        stock_ticker = Sector.source_ticker(stock_ticker)
         if os.path.exists(f"data/{stock_ticker}.csv"):
             df = pd.read_csv(f"data/{stock_ticker}.csv")
             df = df.set_index("Date")
@@ -78,31 +110,98 @@ class Sector:
             df.to_csv(f"data/{stock_ticker}.csv")
         return df
 
-    def calculate_best_worst(self):
-        """Calculates the best performing and worst performing stocks in the sector. """
-        for ticker in self.sector_stocks:
-            try:
-                original_df = self.load_stock(ticker)
-
-                df = original_df.loc[self.start_date : self.midpoint_date].iloc[:-1]
-                initial_price = df["Open"].iloc[0]
-                final_price = df["Close"].iloc[-1]
-
-                performance = (final_price - initial_price) / initial_price * 100
-
-                if self.best_stock == "" or performance > self.best_stock_performance:
-                    self.best_stock = ticker
-                    self.best_stock_df = original_df
-                    self.best_stock_performance = performance
-
-                if self.worst_stock == "" or performance < self.worst_stock_performance:
-                    self.worst_stock = ticker
-                    self.worst_stock_df = original_df
-                    self.worst_stock_performance = performance
-            except:
-                # In case the ticker doesn't have sufficient data, it will
-                # be automatically excluded.
-                pass
+    def calculate_best_worst(
+        self, panel: Optional[PricePanel] = None, scores: Optional[np.ndarray] = None
+    ):
+        """
+        Ranks the sector's stocks by their performance over the lookback window and
+        records the best and worst performing stocks.
+
+        Tickers without enough data for the lookback or test window are excluded up
+        front and recorded in `excluded` with the reason.
+
+        Args:
+            panel (PricePanel): Preloaded prices covering the sector's dates. If omitted,
+                the sector's stocks are loaded with `load_stock`. Required when the
+                windows were set with `set_period`.
+            scores (np.ndarray): A signal to rank on instead of the raw lookback return, one value
+                per panel column, e.g. from `SignalEngine.scores`. The best stock has the highest score.
+        """
+        if panel is None:
+            panel = PricePanel.from_tickers(
+                self.sector_stocks, self.load_stock, source=self.source_ticker
+            )
+
+        period = self.period
+        if period is None:
+            period = panel.period(self.start_date, self.midpoint_date, self.end_date)
+
+        eligible, excluded = panel.eligible(self.sector_stocks, period)
+
+        if scores is None:
+            performances = panel.lookback_returns(eligible, period)
+        else:
+            performances = scores[panel.codes(eligible)].astype(np.float64)
+            scored = ~np.isnan(performances)
+            for ticker, has_score in zip(eligible, scored):
+                if not has_score:
+                    excluded[ticker] = "no signal value"
+            eligible = [ticker for ticker, has_score in zip(eligible, scored) if has_score]
+            performances = performances[scored]
+
+        # Best first; ties keep the sector's ticker order.
+        order = np.argsort(-performances, kind="stable")
+        ranking = [(eligible[i], float(performances[i])) for i in order]
+
+        self.set_ranking(panel, ranking, excluded)
+
+    def set_ranking(
+        self,
+        panel: PricePanel,
+        ranking: List[Tuple[str, float]],
+        excluded: Dict[str, str],
+    ):
+        """
+        Records a ranking, e.g. one computed earlier and read back from a cache, and the best and worst stocks it implies.
+
+        Args:
+            panel (PricePanel): The panel the ranking was computed on.
+            ranking (list[tuple[str, float]]): (ticker, performance) pairs, best first.
+            excluded (dict[str, str]): Tickers left out of the ranking, mapped to the reason.
+        """
+        self.ranking = ranking
+        self.excluded = excluded
+
+        self.best_stock = ""
+        self.worst_stock = ""
+
+        if not self.ranking:
+            return
+
+        self.best_stock, self.best_stock_performance = self.ranking[0]
+        self.worst_stock, self.worst_stock_performance = self.ranking[-1]
+
+        # The stocks' DataFrames are only built if asked for, see `best_stock_df`.
+        self._ranked_panel = panel
+
+    def _stock_frame(self, ticker: str) -> pd.DataFrame:
+        """Returns a ranked panel's prices of a ticker over the sector's lookback and test windows."""
+        period = self.period
+        if period is None:
+            period = self._ranked_panel.period(
+                self.start_date, self.midpoint_date, self.end_date
+            )
+        return self._ranked_panel.frame(ticker, period.lookback_start, period.test_end)
+
+    @property
+    def best_stock_df(self) -> pd.DataFrame:
+        """The best stock's prices over the lookback and test windows, built each time it is accessed."""
+        return self._stock_frame(self.best_stock)
+
+    @property
+    def worst_stock_df(self) -> pd.DataFrame:
+        """The worst stock's prices over the lookback and test windows, built each time it is accessed."""
+        return self._stock_frame(self.worst_stock)
 
     def test_best_worst(self):
         """Calculate the performance of the SHORT and LONG positions,
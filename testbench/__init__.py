@@ -1 +1,3 @@
-from .portfolio import Portfolio
+from .cache import ResultCache
+from .live import LivePosition, LiveSignal
+from .portfolio import Exclusion, Portfolio
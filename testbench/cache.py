@@ -0,0 +1,137 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class ResultCache:
+    """Persistent, size-bounded memo of per-period backtest results.
+
+    Entries are pickled into one file per key. Keys are content hashes of the
+    inputs, including a digest of the price data they were computed from (see
+    `PricePanel.digest`), so changed ticker data simply produces new keys and
+    the stale entries age out. Once the files exceed `max_bytes`, the least
+    recently used entries are deleted.
+    """
+
+    directory: str
+    max_bytes: int
+    size: int
+    hits: int
+    misses: int
+
+    def __init__(self, directory: str = ".cache/results", max_bytes: int = 512 * 1024**2):
+        """
+        Constructor for the ResultCache class.
+
+        Args:
+            directory (str): Where to store the entries. Created if missing.
+            max_bytes (int): The total size the entries may take on disk.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Rebuild the LRU order from the files' modification times, which get() refreshes.
+        entries = []
+        for name in os.listdir(directory):
+            if not name.endswith(".pkl"):
+                continue
+            stat = os.stat(os.path.join(directory, name))
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        self._entries: "OrderedDict[str, int]" = OrderedDict(
+            (key, size) for _, key, size in sorted(entries)
+        )
+        self.size = sum(self._entries.values())
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """
+        Hashes the inputs of a result into a cache key.
+
+        Args:
+            parts: Strings, numbers, or tuples/lists of them, e.g. the kind of result,
+                tickers, dates and a `PricePanel.digest`.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        """
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Reads an entry and marks it as recently used.
+
+        Args:
+            key (str): The entry's key.
+
+        Returns:
+            The stored value, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            self.size -= self._entries.pop(key, 0)
+            self.misses += 1
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError):
+            # Half-written or corrupted: drop it and recompute.
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        if key not in self._entries:
+            # Written by another process sharing the directory.
+            self._entries[key] = os.path.getsize(path)
+            self.size += self._entries[key]
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """
+        Stores an entry, evicting the least recently used ones if the cache grows past `max_bytes`.
+
+        Args:
+            key (str): The entry's key.
+            value: Any picklable value.
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        path = self._path(key)
+
+        # Write then rename, so readers never see a partial entry.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        self.size += len(data) - self._entries.pop(key, 0)
+        self._entries[key] = len(data)
+
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        """Forgets an entry and deletes its file."""
+        self.size -= self._entries.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """Deletes every entry."""
+        for key in list(self._entries):
+            self._remove(key)
@@ -0,0 +1,386 @@
+import json
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from financialcalc.positions import PositionType
+from panel import PricePanel
+
+
+def _rows_after(df: pd.DataFrame, date: pd.Timestamp) -> pd.DataFrame:
+    """Returns the rows of a date-indexed DataFrame after a date, by binary search when the index is sorted."""
+    index = pd.DatetimeIndex(df.index)
+    if index.is_monotonic_increasing:
+        return df.iloc[index.searchsorted(date, side="right") :]
+    return df[index > date]
+
+
+class LivePosition(NamedTuple):
+    """An open position tracked by LiveSignal."""
+
+    sector: str
+    ticker: str
+    pos_type: PositionType
+    entry_price: float
+    capital: float
+
+
+class LiveSignal:
+    """Incremental mean reversion signal that is updated one daily bar at a time.
+
+    Only the last `lookback` bars of every ticker are kept, in a ring buffer, so
+    each new bar costs O(tickers) to absorb and rank instead of a full
+    historical rerun of `Portfolio.run_strategy`. Rankings follow
+    `Sector.calculate_best_worst`: the open of the oldest bar to the close of the
+    newest one, for tickers with a bar at both ends of the window.
+    """
+
+    lookback: int
+    tickers: List[str]
+    sectors: Dict[str, List[str]]
+    last_date: Optional[datetime]
+    positions: List[LivePosition]
+
+    def __init__(self, sectors: Dict[str, List[str]], lookback: int):
+        """
+        Constructor for the LiveSignal class.
+
+        Args:
+            sectors (dict[str, list[str]]): Sector name to its tickers, e.g. the output of `sp500_sectors`.
+            lookback (int): The number of trading days to rank on.
+        """
+        if lookback < 1:
+            raise ValueError("Lookback must be at least one trading day")
+
+        self.lookback = lookback
+        self.sectors = {name: list(stocks) for name, stocks in sectors.items()}
+        self.tickers = list(
+            dict.fromkeys(ticker for stocks in self.sectors.values() for ticker in stocks)
+        )
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self._sector_columns = {
+            name: np.array([self._columns[ticker] for ticker in stocks], dtype=np.intp)
+            for name, stocks in self.sectors.items()
+        }
+
+        self.opens = np.full((lookback, len(self.tickers)), np.nan)
+        self.closes = np.full((lookback, len(self.tickers)), np.nan)
+        self.cursor = 0
+        self.count = 0
+        self.last_date = None
+        self.positions = []
+
+    @classmethod
+    def from_panel(
+        cls, panel: PricePanel, sectors: Dict[str, List[str]], lookback: int
+    ) -> "LiveSignal":
+        """
+        Seeds a signal with the last `lookback` bars of a panel.
+
+        Args:
+            panel (PricePanel): Historical prices for the sectors' tickers.
+            sectors (dict[str, list[str]]): Sector name to its tickers.
+            lookback (int): The number of trading days to rank on.
+
+        Returns:
+            LiveSignal: A signal that is ready to rank if the panel had enough rows.
+        """
+        signal = cls(sectors, lookback)
+        signal._push_rows(panel, max(0, len(panel.dates) - lookback))
+
+        return signal
+
+    @classmethod
+    def from_tickers(
+        cls,
+        sectors: Dict[str, List[str]],
+        lookback: int,
+        loader: Callable[[str], pd.DataFrame],
+    ) -> "LiveSignal":
+        """
+        Seeds a signal from the price store, e.g. with `Sector.load_stock` as the loader.
+
+        Args:
+            sectors (dict[str, list[str]]): Sector name to its tickers.
+            lookback (int): The number of trading days to rank on.
+            loader (Callable[[str], pd.DataFrame]): Returns a ticker's DataFrame.
+
+        Returns:
+            LiveSignal: The seeded signal.
+        """
+        tickers = (ticker for stocks in sectors.values() for ticker in stocks)
+        return cls.from_panel(PricePanel.from_tickers(tickers, loader), sectors, lookback)
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full lookback window has been received."""
+        return self.count >= self.lookback
+
+    def _push(self, date: datetime, opens: np.ndarray, closes: np.ndarray):
+        """Writes one bar for every ticker over the oldest row of the ring buffer."""
+        self.opens[self.cursor] = opens
+        self.closes[self.cursor] = closes
+        self.cursor = (self.cursor + 1) % self.lookback
+        self.count += 1
+        self.last_date = date
+
+    def _push_rows(self, panel: PricePanel, start: int) -> int:
+        """Pushes a panel's rows from `start` onwards, one bar at a time, and returns how many were pushed."""
+        columns = np.array([panel.column(ticker) for ticker in self.tickers], dtype=object)
+        known = np.array([col is not None for col in columns], dtype=bool)
+        panel_cols = columns[known].astype(np.intp)
+
+        for row in range(start, len(panel.dates)):
+            opens = np.full(len(self.tickers), np.nan)
+            closes = np.full(len(self.tickers), np.nan)
+            opens[known] = panel.opens[row, panel_cols]
+            closes[known] = panel.closes[row, panel_cols]
+            self._push(panel.dates[row].to_pydatetime(), opens, closes)
+
+        return max(0, len(panel.dates) - start)
+
+    def update(self, date: datetime, bars: Dict[str, Tuple[float, float]]) -> bool:
+        """
+        Absorbs a new daily bar.
+
+        Args:
+            date (datetime): The date of the bar.
+            bars (dict[str, tuple[float, float]]): Ticker to its (open, close). Tickers missing
+                from the dict are treated as having no data that day.
+
+        Returns:
+            bool: False if the date is not after the last absorbed bar and the update was ignored.
+        """
+        if self.last_date is not None and pd.Timestamp(date) <= pd.Timestamp(self.last_date):
+            return False
+
+        opens = np.full(len(self.tickers), np.nan)
+        closes = np.full(len(self.tickers), np.nan)
+        for ticker, (open_price, close_price) in bars.items():
+            col = self._columns.get(ticker)
+            if col is not None:
+                opens[col] = open_price
+                closes[col] = close_price
+
+        self._push(date, opens, closes)
+        return True
+
+    def refresh(self, frames: Dict[str, pd.DataFrame]) -> int:
+        """
+        Absorbs every bar newer than the last one, e.g. after `MacroTrends.download` refreshed the store.
+
+        Args:
+            frames (dict[str, pd.DataFrame]): Ticker to a date-indexed DataFrame with "Open" and "Close" columns.
+
+        Returns:
+            int: The number of new daily bars absorbed.
+        """
+        if self.last_date is not None:
+            # Only the new bars are aligned, not the whole history.
+            last_date = pd.Timestamp(self.last_date)
+            frames = {
+                ticker: _rows_after(df, last_date) for ticker, df in frames.items()
+            }
+
+        panel = PricePanel.from_frames(frames)
+        start = 0 if self.last_date is None else panel.row(self.last_date, side="right")
+
+        return self._push_rows(panel, start)
+
+    def lookback_returns(self) -> np.ndarray:
+        """
+        Calculates every ticker's percentage return over the current lookback window.
+
+        Returns:
+            np.ndarray: One return per ticker, in `tickers` order, NaN where the ticker is not eligible.
+        """
+        if not self.ready:
+            return np.full(len(self.tickers), np.nan)
+
+        oldest = self.cursor
+        newest = (self.cursor - 1) % self.lookback
+        initial_price = self.opens[oldest]
+        final_price = self.closes[newest]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            performance = (final_price - initial_price) / initial_price * 100
+            performance[~((initial_price > 0) & (final_price > 0))] = np.nan
+
+        return performance
+
+    def signals(self) -> pd.DataFrame:
+        """
+        Ranks every sector on the current lookback window.
+
+        Returns:
+            pd.DataFrame: One row per sector with at least one eligible ticker, indexed by
+            sector, with the best stock to SHORT and the worst stock to LONG and their returns.
+        """
+        performance = self.lookback_returns()
+        rows = {}
+
+        for name, cols in self._sector_columns.items():
+            sector_performance = performance[cols]
+            if cols.size == 0 or np.isnan(sector_performance).all():
+                continue
+
+            best = cols[np.nanargmax(sector_performance)]
+            worst = cols[np.nanargmin(sector_performance)]
+            rows[name] = {
+                "best_stock": self.tickers[best],
+                "best_stock_performance": performance[best],
+                "worst_stock": self.tickers[worst],
+                "worst_stock_performance": performance[worst],
+            }
+
+        return pd.DataFrame.from_dict(
+            rows,
+            orient="index",
+            columns=[
+                "best_stock",
+                "best_stock_performance",
+                "worst_stock",
+                "worst_stock_performance",
+            ],
+        )
+
+    def latest_close(self, ticker: str) -> float:
+        """Returns a ticker's most recent close, NaN if it had no bar on the last day."""
+        return float(self.closes[(self.cursor - 1) % self.lookback, self._columns[ticker]])
+
+    def rebalance(self, capital: float) -> List[LivePosition]:
+        """
+        Replaces the open positions with the current signals, entered at the latest close.
+
+        Capital is split evenly across sectors with a signal, and each sector's share evenly
+        between the SHORT of its best stock and the LONG of its worst stock.
+
+        Args:
+            capital (float): The capital to allocate.
+
+        Returns:
+            list[LivePosition]: The new open positions.
+        """
+        signals = self.signals()
+        self.positions = []
+
+        if signals.empty:
+            return self.positions
+
+        sector_capital = capital / len(signals)
+
+        for name, signal in signals.iterrows():
+            self.positions.append(
+                LivePosition(
+                    name,
+                    signal["best_stock"],
+                    PositionType.SHORT,
+                    self.latest_close(signal["best_stock"]),
+                    sector_capital / 2,
+                )
+            )
+            self.positions.append(
+                LivePosition(
+                    name,
+                    signal["worst_stock"],
+                    PositionType.LONG,
+                    self.latest_close(signal["worst_stock"]),
+                    sector_capital / 2,
+                )
+            )
+
+        return self.positions
+
+    def mark_to_market(self) -> pd.DataFrame:
+        """
+        Values the open positions at the latest close, without compounding, like `calculate_position_daily`.
+
+        Returns:
+            pd.DataFrame: One row per open position with its current price and value.
+        """
+        rows = []
+
+        for position in self.positions:
+            price = self.latest_close(position.ticker)
+
+            if position.pos_type == PositionType.LONG:
+                value = position.capital * (price / position.entry_price)
+            else:
+                value = position.capital * (position.entry_price / price)
+
+            rows.append(
+                {
+                    "sector": position.sector,
+                    "ticker": position.ticker,
+                    "position": position.pos_type.name,
+                    "entry_price": position.entry_price,
+                    "price": price,
+                    "capital": position.capital,
+                    "value": value,
+                }
+            )
+
+        return pd.DataFrame(
+            rows,
+            columns=[
+                "sector",
+                "ticker",
+                "position",
+                "entry_price",
+                "price",
+                "capital",
+                "value",
+            ],
+        )
+
+    def save(self, path: str):
+        """
+        Writes the rolling state and open positions to a small .npz file.
+
+        Args:
+            path (str): The file to write.
+        """
+        meta = {
+            "lookback": self.lookback,
+            "sectors": self.sectors,
+            "cursor": self.cursor,
+            "count": self.count,
+            "last_date": None if self.last_date is None else self.last_date.strftime("%Y-%m-%d"),
+            "positions": [
+                [p.sector, p.ticker, p.pos_type.name, p.entry_price, p.capital]
+                for p in self.positions
+            ],
+        }
+
+        with open(path, "wb") as f:
+            np.savez(f, opens=self.opens, closes=self.closes, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path: str) -> "LiveSignal":
+        """
+        Restores a signal written by `save`.
+
+        Args:
+            path (str): The file to read.
+
+        Returns:
+            LiveSignal: The restored signal.
+        """
+        with np.load(path) as state:
+            meta = json.loads(str(state["meta"]))
+            signal = cls(meta["sectors"], meta["lookback"])
+            signal.opens = state["opens"]
+            signal.closes = state["closes"]
+
+        signal.cursor = meta["cursor"]
+        signal.count = meta["count"]
+        if meta["last_date"] is not None:
+            signal.last_date = datetime.strptime(meta["last_date"], "%Y-%m-%d")
+        signal.positions = [
+            LivePosition(sector, ticker, PositionType[pos_type], entry_price, capital)
+            for sector, ticker, pos_type, entry_price, capital in meta["positions"]
+        ]
+
+        return signal
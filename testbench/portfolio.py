@@ -1,13 +1,30 @@
 import random
 from datetime import datetime
-from typing import List
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import pandas as pd
 
 from financialcalc.positions import PositionType, calculate_position_daily
-from helpers import get_row_by_date, parse_timeframe
+from helpers import calendar_span
+from panel import (CompactPricePanel, PartitionedStore, Period, Prefetcher,
+                   PricePanel, SignalEngine, build_schedule)
 from sector.sector import Sector
 
+from .cache import ResultCache
+
+
+# Extra history loaded before the first lookback window.
+LOAD_PADDING = "1w"
+
+
+class Exclusion(NamedTuple):
+    """A ticker (or pair of tickers) left out of a test, and why."""
+
+    test: int
+    sector: str
+    ticker: str
+    reason: str
+
 
 class Portfolio:
     balance = 0
@@ -15,6 +32,20 @@ class Portfolio:
     backtest_interval: str
     test_interval: str
     end_date: datetime
+    step_interval: Optional[str]
+    skip_interval: Optional[str]
+    cache: Optional[ResultCache]
+    compact: bool
+    store: Optional[PartitionedStore]
+    prefetch: int
+    load_workers: int
+    signal: str
+
+    panel: PricePanel
+    calendar: pd.DatetimeIndex
+    signals: Optional[SignalEngine]
+    schedule: List[Period]
+    exclusions: List[Exclusion]
 
     def __init__(
         self,
@@ -23,15 +54,31 @@ class Portfolio:
         backtest_interval: str,
         test_interval: str,
         end_date: datetime,
+        step_interval: Optional[str] = None,
+        skip_interval: Optional[str] = None,
+        cache: Optional[ResultCache] = None,
+        compact: bool = False,
+        store: Optional[PartitionedStore] = None,
+        prefetch: int = 0,
+        load_workers: int = 1,
+        signal: str = "return",
     ):
         """Constructor for the Portfolio class.
 
         Args:
             starting_balance: The balance to start the portfolio with.
             start_date: The date to begin the portfolio at.
-            backtest_interval: The interval to look back to determine best and worst performing stocks (e.g., "1m" for 1 month, "1d" for 1 day, etc.).
+            backtest_interval: The interval to look back to determine best and worst performing stocks (e.g., "1m" for 1 month, "1d" for 1 day, "21t" for 21 trading days, etc.).
             test_interval: The interval to have the position open for.
             end_date: The date to end the portfolio at.
+            step_interval: The interval between rebalances. Defaults to test_interval. When shorter, each test is cut short at the next rebalance.
+            skip_interval: A gap between the end of the lookback window and opening the positions. Defaults to no gap.
+            cache: Where to memoize sector rankings and position series across runs. Defaults to no caching.
+            compact: Load prices into a CompactPricePanel (float32 prices, int32 day ordinals) to fit very large universes in memory.
+            store: Stream each test's window from a PartitionedStore instead of loading every ticker up front, for universes that do not fit in memory.
+            prefetch: With a store, how many upcoming test windows to read in a background thread while the current test runs. 0 reads each window when it is needed.
+            load_workers: How many tickers to load or download concurrently when building the in-memory panel.
+            signal: What to rank each sector on, one of `SignalEngine.SIGNALS`. Defaults to the raw lookback return.
         """
 
         self.balance = starting_balance
@@ -39,20 +86,110 @@ class Portfolio:
         self.backtest_interval = backtest_interval
         self.test_interval = test_interval
         self.end_date = end_date
+        self.step_interval = step_interval
+        self.skip_interval = skip_interval
+        self.cache = cache
+        self.compact = compact
+        self.store = store
+        self.prefetch = prefetch
+        self.load_workers = load_workers
+
+        if signal not in SignalEngine.SIGNALS:
+            raise ValueError(f"Unknown signal: {signal!r}")
+        self.signal = signal
+        self.signals = None
+        self.exclusions = []
+
+    def load_panel(self, tickers: Iterable[str]) -> Optional[PricePanel]:
+        """Loads every ticker once, over the dates the strategy can touch, and builds the test schedule.
+
+        With a `store`, nothing is loaded here; only its calendar is read, and
+        each test's window is streamed in by `_test_windows`.
+
+        Args:
+            tickers: The tickers of every sector that will be tested.
+
+        Returns:
+            PricePanel or None: The loaded panel, also stored on `self.panel`, or None with a store.
+        """
+        if self.store is not None:
+            self.calendar = self.store.calendar
+            self._store_tickers = list(tickers)
+        else:
+            panel_class = CompactPricePanel if self.compact else PricePanel
+            self.panel = panel_class.from_tickers(
+                tickers,
+                Sector.load_stock,
+                # A week of padding, so a lookback that starts on a weekend or holiday
+                # still has trading days before it and isn't taken for truncated.
+                self.start_date
+                - calendar_span(self.backtest_interval)
+                - calendar_span(LOAD_PADDING),
+                self.end_date,
+                workers=self.load_workers,
+                source=Sector.source_ticker,
+            )
+            self.calendar = self.panel.dates
+            self._load_signals()
+
+        self.schedule = build_schedule(
+            self.calendar,
+            self.start_date,
+            self.end_date,
+            self.backtest_interval,
+            self.test_interval,
+            self.step_interval,
+            self.skip_interval,
+        )
+        return None if self.store is not None else self.panel
+
+    def _load_signals(self):
+        """Sets up the signal engine for the current panel, unless ranking on the raw lookback return."""
+        if self.signal == "return":
+            self.signals = None
+        else:
+            self.signals = SignalEngine(self.panel)
+
+    def _test_windows(self) -> Iterator[Tuple[int, Period, int]]:
+        """Yields each test's index, period and hold end as rows of `self.panel`.
+
+        With a `store`, `self.panel` is replaced by the test's window before each
+        yield, and partitions before the window are released. With `prefetch`,
+        the next windows are read in the background while the current test runs.
+        """
+        if self.store is None:
+            for i, period in enumerate(self.schedule):
+                yield i, period, self._hold_end(i)
+            return
+
+        def load_window(period: Period) -> PricePanel:
+            self.store.release_before(period.lookback_start)
+            return self.store.window(
+                period.lookback_start, period.test_end, self._store_tickers
+            )
+
+        if self.prefetch > 0:
+            windows = Prefetcher(load_window, self.schedule, depth=self.prefetch)
+        else:
+            windows = ((period, load_window(period)) for period in self.schedule)
+
+        for i, (period, window) in enumerate(windows):
+            self.panel = window
+            self._load_signals()
+
+            offset = -period.lookback_start
+            yield i, period.shifted(offset), self._hold_end(i) + offset
 
     def calculate_positions(
         self,
         capital: float,
         best_stock: str,
         worst_stock: str,
-        start_date: datetime,
-        end_date: datetime,
+        start_row: int,
+        end_row: int,
     ) -> pd.Series:
-        best_stock_df = Sector.load_stock(best_stock)
-        worst_stock_df = Sector.load_stock(worst_stock)
-
-        best_stock_df = best_stock_df.loc[start_date:end_date]
-        worst_stock_df = worst_stock_df.loc[start_date:end_date]
+        best_stock_df = self.panel.frame(best_stock, start_row, end_row)
+        worst_stock_df = self.panel.frame(worst_stock, start_row, end_row)
 
         best_position = calculate_position_daily(
             capital / 2, best_stock_df, PositionType.SHORT
@@ -63,68 +200,179 @@ class Portfolio:
 
         return best_position + worst_position
 
-    def run_strategy(self, sectors: List[Sector], random_stocks=False) -> pd.Series:
-        backtest_timeframe_delta = parse_timeframe(self.backtest_interval)
-        test_timeframe_delta = parse_timeframe(self.test_interval)
+    def _cached_positions(
+        self,
+        capital: float,
+        best_stock: str,
+        worst_stock: str,
+        start_row: int,
+        end_row: int,
+    ) -> pd.Series:
+        """calculate_positions, memoized in `self.cache` per unit of capital, since positions scale linearly with it."""
+        if self.cache is None:
+            return self.calculate_positions(
+                capital, best_stock, worst_stock, start_row, end_row
+            )
+
+        key = ResultCache.key(
+            "positions",
+            best_stock,
+            worst_stock,
+            self.panel.digest([best_stock, worst_stock], start_row, end_row),
+        )
+        unit_values = self.cache.get(key)
 
-        utcnow = datetime.now()
-        time_delta = utcnow + test_timeframe_delta - utcnow
+        if unit_values is None:
+            unit_values = self.calculate_positions(
+                1.0, best_stock, worst_stock, start_row, end_row
+            ).to_numpy()
+            self.cache.put(key, unit_values)
 
-        total_tests = (self.end_date - self.start_date) // time_delta
+        return pd.Series(
+            unit_values * capital, index=self.panel.dates[start_row:end_row]
+        )
 
-        print(f"Total Tests: {total_tests}")
+    def _rank_sector(self, sector: Sector, period: Period):
+        """Ranks a sector for a period, reusing a cached ranking of the same stocks and prices when there is one."""
+        sector.set_period(self.panel, period)
+
+        scores = None
+        if self.signals is not None:
+            scores = self.signals.scores(self.signal, period)
+
+        if self.cache is None:
+            sector.calculate_best_worst(self.panel, scores)
+            return
+
+        key = ResultCache.key(
+            "ranking",
+            self.signal,
+            sector.sector_stocks,
+            tuple(period.shifted(-period.lookback_start)),
+            self.panel.digest(
+                sector.sector_stocks, period.lookback_start, period.test_end
+            ),
+        )
+        cached = self.cache.get(key)
 
-        current_date = self.start_date
+        if cached is None:
+            sector.calculate_best_worst(self.panel, scores)
+            self.cache.put(key, (sector.ranking, sector.excluded))
+        else:
+            sector.set_ranking(self.panel, *cached)
 
-        portfolio_value = pd.Series()
+    def exclusion_report(self) -> pd.DataFrame:
+        """Returns every exclusion recorded so far as a DataFrame, one row per ticker and test."""
+        return pd.DataFrame(self.exclusions, columns=list(Exclusion._fields))
+
+    def _open_sector_positions(
+        self,
+        test: int,
+        sector: Sector,
+        capital: float,
+        hold_end: int,
+        random_stocks: bool,
+    ) -> Optional[pd.Series]:
+        """Opens the sector's SHORT/LONG pair.
+
+        Every ranked ticker already has a bar on each test row (see `PricePanel.eligible`),
+        which replaces retrying with other stocks when a position cannot be valued.
 
-        for i in range(total_tests):
+        Returns:
+            pd.Series or None: The pair's daily value, or None if it could not be valued.
+        """
+        eligible = [ticker for ticker, _ in sector.ranking]
+
+        if not random_stocks:
+            best_stock = eligible[0]
+            worst_stock = eligible[-1]
+        else:
+            best_stock = random.choice(eligible)
+            worst_stock = random.choice(eligible)
 
-            backtest_start_date = current_date - backtest_timeframe_delta
-            backtest_end_date = current_date
-            test_start_date = current_date
-            test_end_date = current_date + test_timeframe_delta
-            current_date = test_end_date
+        positions = self._cached_positions(
+            capital, best_stock, worst_stock, sector.period.rebalance, hold_end
+        )
 
-            sector_performance_series = pd.Series()
+        if not positions.empty and not positions.isna().any():
+            return positions
+
+        self.exclusions.append(
+            Exclusion(
+                test,
+                sector.sector_name,
+                f"{best_stock}/{worst_stock}",
+                "position could not be valued",
+            )
+        )
+        return None
 
-            for sector in sectors:
-                sector.set_dates(
-                    backtest_start_date.strftime("%Y-%m-%d"),
-                    backtest_end_date.strftime("%Y-%m-%d"),
-                    test_end_date.strftime("%Y-%m-%d"),
+    def _run_test(
+        self,
+        test: int,
+        sectors: List[Sector],
+        period: Period,
+        hold_end: int,
+        random_stocks: bool,
+    ) -> pd.Series:
+        """Ranks every sector for one test period and returns the combined daily value of their positions over rows [period.rebalance, hold_end)."""
+        for sector in sectors:
+            self._rank_sector(sector, period)
+
+            for ticker, reason in sector.excluded.items():
+                self.exclusions.append(
+                    Exclusion(test, sector.sector_name, ticker, reason)
                 )
-                best_stock = ""
-                worst_stock = ""
-
-                while True:
-
-                    if not random_stocks:
-                        sector.calculate_best_worst()
-
-                        best_stock = sector.best_stock
-                        worst_stock = sector.worst_stock
-                    else:
-                        best_stock = random.choice(sector.sector_stocks)
-                        worst_stock = random.choice(sector.sector_stocks)
-
-                    capital = self.balance / len(sectors)
-                    try:
-                        positions = self.calculate_positions(
-                            capital,
-                            best_stock,
-                            worst_stock,
-                            test_start_date,
-                            test_end_date,
-                        )
-
-                        if sector_performance_series.empty:
-                            sector_performance_series = positions
-                        else:
-                            sector_performance_series += positions
-                        break
-                    except:
-                        pass
+
+        active_sectors = [sector for sector in sectors if sector.ranking]
+
+        test_dates = self.panel.dates[period.rebalance : hold_end]
+
+        if not active_sectors:
+            print(f"No sector has enough data for test {test + 1}, holding cash")
+            return pd.Series(self.balance, index=test_dates)
+
+        capital = self.balance / len(active_sectors)
+        sector_performance_series = pd.Series(0.0, index=test_dates)
+
+        for sector in active_sectors:
+            positions = self._open_sector_positions(
+                test, sector, capital, hold_end, random_stocks
+            )
+
+            if positions is None:
+                # The pair could not be valued, so the sector's share stays in cash.
+                sector_performance_series += capital
+            else:
+                sector_performance_series += positions
+
+        return sector_performance_series
+
+    def _hold_end(self, test: int) -> int:
+        """Returns one past the last row held in a test, cutting overlapping tests short at the next rebalance."""
+        test_end = self.schedule[test].test_end
+
+        if test + 1 < len(self.schedule):
+            return min(test_end, self.schedule[test + 1].rebalance)
+
+        return test_end
+
+    def run_strategy(self, sectors: List[Sector], random_stocks=False) -> pd.Series:
+        self.load_panel(ticker for sector in sectors for ticker in sector.sector_stocks)
+
+        print(f"Total Tests: {len(self.schedule)}")
+
+        portfolio_value = pd.Series()
+
+        for i, period, hold_end in self._test_windows():
+
+            sector_performance_series = self._run_test(
+                i, sectors, period, hold_end, random_stocks
+            )
+
+            if sector_performance_series.empty:
+                print(f"No trading days in test {i+1}, skipping")
+                continue
 
             if portfolio_value.empty:
                 portfolio_value = sector_performance_series
@@ -138,38 +386,39 @@ class Portfolio:
             print(portfolio_value.tail(25))
             portfolio_value.to_csv("port.csv")
 
+        print(f"Excluded Tickers: {len(self.exclusions)}")
+        if self.cache is not None:
+            print(f"Cache Hits: {self.cache.hits}, Misses: {self.cache.misses}")
+
         return portfolio_value
 
     def run_custom_sectors(
         self, sector_definitions: pd.DataFrame, random_stocks=False
     ) -> pd.Series:
-        backtest_timeframe_delta = parse_timeframe(self.backtest_interval)
-        test_timeframe_delta = parse_timeframe(self.test_interval)
-
-        utcnow = datetime.now()
-        time_delta = utcnow + test_timeframe_delta - utcnow
-
-        total_tests = (self.end_date - self.start_date) // time_delta
+        self.load_panel(sector_definitions.columns)
 
-        print(f"Total Tests: {total_tests}")
+        print(f"Total Tests: {len(self.schedule)}")
 
-        current_date = self.start_date
+        # The most recent sector definition on or before each lookback start.
+        definition_rows = (
+            sector_definitions.index.searchsorted(
+                self.calendar[[period.lookback_start for period in self.schedule]],
+                side="right",
+            )
+            - 1
+        )
 
         portfolio_value = pd.Series()
 
-        for i in range(total_tests):
+        for i, period, hold_end in self._test_windows():
 
-            backtest_start_date = current_date - backtest_timeframe_delta
-            backtest_end_date = current_date
-            test_start_date = current_date
-            test_end_date = current_date + test_timeframe_delta
-            current_date = test_end_date
+            if definition_rows[i] < 0:
+                print(f"No sector definition before test {i+1}, skipping")
+                continue
 
             sector_obj = {}
 
-            # sector_definition = sector_definitions.loc[backtest_start_date]
-
-            sector_definition = get_row_by_date(sector_definitions, backtest_start_date)
+            sector_definition = sector_definitions.iloc[definition_rows[i]]
 
             # for each column in the row
             for column in sector_definition.index:
@@ -181,45 +430,13 @@ class Portfolio:
 
             sectors = [Sector(name, sector_obj[name]) for name in sector_obj.keys()]
 
-            sector_performance_series = pd.Series()
+            sector_performance_series = self._run_test(
+                i, sectors, period, hold_end, random_stocks
+            )
 
-            for sector in sectors:
-                sector.set_dates(
-                    backtest_start_date.strftime("%Y-%m-%d"),
-                    backtest_end_date.strftime("%Y-%m-%d"),
-                    test_end_date.strftime("%Y-%m-%d"),
-                )
-                best_stock = ""
-                worst_stock = ""
-
-                while True:
-
-                    if not random_stocks:
-                        sector.calculate_best_worst()
-
-                        best_stock = sector.best_stock
-                        worst_stock = sector.worst_stock
-                    else:
-                        best_stock = random.choice(sector.sector_stocks)
-                        worst_stock = random.choice(sector.sector_stocks)
-
-                    capital = self.balance / len(sectors)
-                    try:
-                        positions = self.calculate_positions(
-                            capital,
-                            best_stock,
-                            worst_stock,
-                            test_start_date,
-                            test_end_date,
-                        )
-
-                        if sector_performance_series.empty:
-                            sector_performance_series = positions
-                        else:
-                            sector_performance_series += positions
-                        break
-                    except:
-                        pass
+            if sector_performance_series.empty:
+                print(f"No trading days in test {i+1}, skipping")
+                continue
 
             if portfolio_value.empty:
                 portfolio_value = sector_performance_series
@@ -232,3 +449,9 @@ class Portfolio:
             print(f"Balance After Test {i+1}: {self.balance}")
             print(portfolio_value.tail(25))
             portfolio_value.to_csv("port2.csv")
+
+        print(f"Excluded Tickers: {len(self.exclusions)}")
+        if self.cache is not None:
+            print(f"Cache Hits: {self.cache.hits}, Misses: {self.cache.misses}")
+
+        return portfolio_value